@@ -1,4 +1,8 @@
+import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+import h5py
 import numpy as np
 from models.ssn_model import SSNModel
 from models.visual_stimulus import VisualStimulus
@@ -9,119 +13,201 @@ from utils.plotting import plot_orientation_map, plot_stimulus, plot_condition_g
 # Configuration
 orientation_map_path = "data/orientation_maps/M28D20240118R0OrientationP2.mat"  # Path to .mat file for orientation map
 opsin_map_dir = "data/expression_maps/"  # Directory containing opsin expression .tif files
-gcamp_map_dir = "data/expression_maps/"  # Directory containing GCaMP expression .tif files
 output_dir = "results/trial_data/"  # Directory to save trial outputs
 stimuli_dir = "results/stimuli/"  # Directory to save stimuli plots
-os.makedirs(output_dir, exist_ok=True)
-os.makedirs("results/orientation_maps", exist_ok=True)
-os.makedirs(stimuli_dir, exist_ok=True)
-crop_size=64
-# Load orientation map
-try:
-    orientation_map = load_orientation_map(orientation_map_path, central_region_size=crop_size)
-    print("Orientation map successfully loaded.")
-except Exception as e:
-    print(f"Error loading orientation map: {e}")
-    exit(1)
-
-# Load and crop expression maps
-try:
-    opsin_map = search_and_load_tif(opsin_map_dir, "EX570", central_region_size=crop_size)
-    gcamp_map = search_and_load_tif(gcamp_map_dir, "EX480", central_region_size=crop_size)
-    print("Expression maps successfully loaded and cropped.")
-except Exception as e:
-    print(f"Error loading expression maps: {e}")
-    exit(1)
-
-
-# Initialize the SSN model
-ssn_model = SSNModel(
-    orientation_map=orientation_map,
-    size=(64, 64)
-)
-
-# Define conditions for visual and optogenetic stimuli
-contrasts = [0.2, 0.5, 1.0]  # Example contrast levels
-orientations = [0, 90]  # Visual orientations
-column_tunings = [0, 90]  # Optogenetic column tunings
-
-# Preallocate storage for trial data and metadata
-trial_data_all_conditions = []
-metadata = []
-
-# Adjust trial duration to 300 ms and bin size to 100 ms
-trial_duration = 0.3  # seconds (300 ms)
-bin_size = 0.1  # seconds (100 ms bins instead of 50 ms)
-
-# Run trials for all conditions
-for contrast in contrasts:
-    for orientation in orientations:
-        for tuning in column_tunings:
-            # Initialize stimuli (parameters passed to SSNModel)
+crop_size = 64
+
+# SSN model shared by the trials of one worker process (set by _init_worker)
+_worker_model = None
+
+
+def _init_worker(ssn_model):
+    """
+    Store the SSN model in a worker process. Its kernels are read-only after construction,
+    so it is pickled once per worker instead of once per task.
+    """
+    global _worker_model
+    _worker_model = ssn_model
+
+
+def _run_chunk(args):
+    """
+    Run one chunk of the condition batch in a worker process.
+
+    Parameters:
+    - args: tuple of (visual_inputs, opto_inputs, trial_duration, bin_size, opsin_map).
+
+    Returns:
+    - 4D numpy array of firing rates for the chunk (batch x grid x grid x time_bins).
+    """
+    visual_inputs, opto_inputs, trial_duration, bin_size, opsin_map = args
+    return _worker_model.run_trials_batched(
+        visual_inputs,
+        opto_inputs,
+        trial_duration=trial_duration,
+        bin_size=bin_size,
+        opsin_map=opsin_map
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the SSN condition sweep.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes for the condition sweep (default: 1, in-process).")
+    parser.add_argument("--plot-stimuli", action="store_true",
+                        help="Save a plot of every visual and optogenetic stimulus (off by default).")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    os.makedirs(output_dir, exist_ok=True)
+    os.makedirs("results/orientation_maps", exist_ok=True)
+    if args.plot_stimuli:
+        os.makedirs(stimuli_dir, exist_ok=True)
+
+    # Load orientation map
+    try:
+        orientation_map = load_orientation_map(orientation_map_path, central_region_size=crop_size)
+        print("Orientation map successfully loaded.")
+    except Exception as e:
+        print(f"Error loading orientation map: {e}")
+        return 1
+
+    # Load and crop the opsin expression map (the GCaMP map is not used by the sweep)
+    try:
+        opsin_map = search_and_load_tif(opsin_map_dir, "EX570", central_region_size=crop_size)
+        print("Opsin expression map successfully loaded and cropped.")
+    except Exception as e:
+        print(f"Error loading opsin expression map: {e}")
+        return 1
+
+
+    # Initialize the SSN model
+    ssn_model = SSNModel(
+        orientation_map=orientation_map,
+        size=(64, 64)
+    )
+
+    # Define conditions for visual and optogenetic stimuli
+    contrasts = [0.2, 0.5, 1.0]  # Example contrast levels
+    orientations = [0, 90]  # Visual orientations
+    column_tunings = [0, 90]  # Optogenetic column tunings
+
+    # Adjust trial duration to 300 ms and bin size to 100 ms
+    trial_duration = 0.3  # seconds (300 ms)
+    bin_size = 0.1  # seconds (100 ms bins instead of 50 ms)
+
+    # Optogenetic stimuli depend only on the column tuning; generate them once for the sweep
+    opto_inputs = {}
+    for tuning in column_tunings:
+        opto_stimulus = OptogeneticStimulus(
+            column_tuning=tuning,
+            num_columns=10,
+            column_area=50,
+            power=1.0
+        )
+        opto_inputs[tuning] = opto_stimulus.generate_input((64, 64), orientation_map)
+
+        # Plot stimulus for debugging
+        if args.plot_stimuli:
+            plot_stimulus(opto_inputs[tuning],
+                          title=f"Optogenetic Stimulus: Tuning={tuning}°",
+                          save_path=f"{stimuli_dir}opto_t{tuning}.png")
+
+    # Preallocate inputs, firing rates and metadata for all conditions so the SSN runs them as
+    # a single batch and writes straight into one contiguous array
+    num_conditions = len(contrasts) * len(orientations) * len(column_tunings)
+    time_bins = ssn_model.num_time_bins(trial_duration, bin_size)
+    visual_inputs = np.empty((num_conditions, 64, 64), dtype=np.float32)
+    opto_inputs_batch = np.empty((num_conditions, 64, 64), dtype=np.float32)
+    trial_data_all_conditions = np.empty((num_conditions, 64, 64, time_bins), dtype=np.float32)
+    metadata = np.empty(num_conditions, dtype=[("contrast", "f8"), ("orientation", "f8"), ("column_tuning", "f8")])
+
+    condition_idx = 0
+    for contrast in contrasts:
+        for orientation in orientations:
+            # Visual stimuli do not depend on the column tuning; generate them once per pair
             visual_stimulus = VisualStimulus(
                 orientation=orientation,
                 spatial_frequency=2,
                 contrast=contrast,
                 size=2
             )
-            opto_stimulus = OptogeneticStimulus(
-                column_tuning=tuning,
-                num_columns=10,
-                column_area=50,
-                power=1.0
-            )
-
-            # Generate inputs for visualization
             visual_input = visual_stimulus.generate_input((64, 64))
-            opto_input = opto_stimulus.generate_input((64, 64), orientation_map)
-
-            # Plot stimuli for debugging
-            plot_stimulus(visual_input,
-                          title=f"Visual Stimulus: Contrast={contrast}, Ori={orientation}°",
-                          save_path=f"{stimuli_dir}visual_c{contrast}_o{orientation}.png")
-            plot_stimulus(opto_input,
-                          title=f"Optogenetic Stimulus: Tuning={tuning}°",
-                          save_path=f"{stimuli_dir}opto_t{tuning}.png")
-
-            # Run trial with opsin_map during optogenetic stimulation
-            trial_data = ssn_model.run_trial(
-                visual_stim=visual_stimulus,
-                opto_stim=opto_stimulus,
-                trial_duration=trial_duration,
-                bin_size=bin_size,
-                opsin_map=opsin_map  # Pass the opsin map here
-            )
 
-            # Append data
-            trial_data_all_conditions.append(trial_data)
-            metadata.append({
-                "contrast": contrast,
-                "orientation": orientation,
-                "column_tuning": tuning
-            })
-
-            print(f"Trial completed: Contrast={contrast}, Orientation={orientation}, Opto={tuning}")
-
-# Save trial data
-output_path = os.path.join(output_dir, "output_activity.npy")
-np.save(output_path, trial_data_all_conditions)
-print(f"Trial data saved successfully to {output_path}")
-
-# Save metadata
-metadata_path = os.path.join(output_dir, "metadata.npy")
-np.save(metadata_path, metadata)
-
-# Plot orientation map
-plot_orientation_map(orientation_map, save_path="results/orientation_maps/orientation_map.png")
-
-# Generate condition grid plot
-plot_condition_grid(
-    trial_data_all_conditions,
-    metadata,
-    contrasts,
-    orientations,
-    column_tunings,
-    save_path="results/condition_grid.png"
-)
-
-print("All processing complete.")
+            # Plot stimulus for debugging
+            if args.plot_stimuli:
+                plot_stimulus(visual_input,
+                              title=f"Visual Stimulus: Contrast={contrast}, Ori={orientation}°",
+                              save_path=f"{stimuli_dir}visual_c{contrast}_o{orientation}.png")
+
+            for tuning in column_tunings:
+                visual_inputs[condition_idx] = visual_input
+                opto_inputs_batch[condition_idx] = opto_inputs[tuning]
+                metadata[condition_idx] = (contrast, orientation, tuning)
+                condition_idx += 1
+
+    # Run trials for all conditions with opsin_map during optogenetic stimulation
+    if args.workers > 1:
+        # Split the batch into one contiguous chunk per worker; each chunk still runs as a batch
+        chunk_slices = [
+            slice(indices[0], indices[-1] + 1)
+            for indices in np.array_split(np.arange(num_conditions), args.workers)
+            if len(indices) > 0
+        ]
+        chunks = [
+            (visual_inputs[chunk], opto_inputs_batch[chunk], trial_duration, bin_size, opsin_map)
+            for chunk in chunk_slices
+        ]
+        with ProcessPoolExecutor(max_workers=len(chunks), initializer=_init_worker,
+                                 initargs=(ssn_model,)) as executor:
+            for chunk, chunk_data in zip(chunk_slices, executor.map(_run_chunk, chunks)):
+                trial_data_all_conditions[chunk] = chunk_data
+    else:
+        ssn_model.run_trials_batched(
+            visual_inputs,
+            opto_inputs_batch,
+            trial_duration=trial_duration,
+            bin_size=bin_size,
+            opsin_map=opsin_map,  # Pass the opsin map here
+            out=trial_data_all_conditions
+        )
+    for meta in metadata:
+        print(f"Trial completed: Contrast={meta['contrast']}, Orientation={meta['orientation']}, "
+              f"Opto={meta['column_tuning']}")
+
+    # Save trial data and metadata to HDF5, chunked per trial so single conditions can be read lazily
+    output_path = os.path.join(output_dir, "output_activity.h5")
+    with h5py.File(output_path, "w") as output_file:
+        activity_dataset = output_file.create_dataset(
+            "activity",
+            data=trial_data_all_conditions,
+            chunks=(1,) + trial_data_all_conditions.shape[1:],
+            compression="lzf"
+        )
+        activity_dataset.attrs["trial_duration"] = trial_duration
+        activity_dataset.attrs["bin_size"] = bin_size
+        output_file.create_dataset("metadata", data=metadata)
+    print(f"Trial data saved successfully to {output_path}")
+
+    # Plot orientation map
+    plot_orientation_map(orientation_map, save_path="results/orientation_maps/orientation_map.png")
+
+    # Generate condition grid plot
+    plot_condition_grid(
+        trial_data_all_conditions,
+        metadata,
+        contrasts,
+        orientations,
+        column_tunings,
+        save_path="results/condition_grid.png"
+    )
+
+    print("All processing complete.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -12,12 +12,16 @@ class NeuronLayer:
     - I_population: Boolean mask for inhibitory neurons
     """
 
-    def __init__(self, network_size=(512, 512), e_ratio=0.8):
+    def __init__(self, network_size=(512, 512), e_ratio=0.8, rng=None):
         self.size = network_size
         self.e_ratio = e_ratio
+        # rng may be a np.random.Generator or an int seed; by default it is seeded from the
+        # global np.random state, so np.random.seed() still makes the populations reproducible
+        self.rng = np.random.default_rng(rng if rng is not None else np.random.randint(2**31))
         self.E_population, self.I_population = self.initialize_neuron_population()
 
     def initialize_neuron_population(self):
-        e_neurons = np.random.rand(*self.size) < self.e_ratio
+        # float32 draws use half the random bytes of float64 and keep e_ratio exact
+        e_neurons = self.rng.random(self.size, dtype=np.float32) < self.e_ratio
         i_neurons = ~e_neurons
         return e_neurons, i_neurons
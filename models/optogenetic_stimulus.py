@@ -1,7 +1,12 @@
 import numpy as np
 
 class OptogeneticStimulus:
-    def __init__(self, column_tuning, num_columns, column_area, power):
+    # Float masks per (column_tuning, tolerance), shared by all instances. Valid for the
+    # orientation map object in _mask_cache_map only; cleared when a different map is passed.
+    _mask_cache = {}
+    _mask_cache_map = None
+
+    def __init__(self, column_tuning, num_columns, column_area, power, tolerance=1.0):
         """
         Initialize the optogenetic stimulus.
 
@@ -10,11 +15,13 @@ class OptogeneticStimulus:
         - num_columns: int. Number of columns stimulated.
         - column_area: float. Area of each stimulated column.
         - power: float. Light power in mW.
+        - tolerance: float, default 1.0. Max deviation (degrees) from column_tuning to be targeted.
         """
         self.column_tuning = column_tuning
         self.num_columns = num_columns
         self.column_area = column_area
         self.power = power
+        self.tolerance = tolerance
 
     def generate_input(self, grid_size, orientation_map):
         """
@@ -25,14 +32,21 @@ class OptogeneticStimulus:
         - orientation_map: 2D numpy array of orientation preferences.
 
         Returns:
-        - 2D numpy array of the optogenetic input.
+        - 2D float32 numpy array of the optogenetic input.
         """
-        rows, cols = grid_size
-
-        # Create a binary mask for the target orientation
-        mask = (orientation_map == self.column_tuning)
-
-        # Normalize the mask and scale by the optogenetic power
-        opto_input = mask.astype(float) * self.power
-        return opto_input / np.max(opto_input) if np.max(opto_input) > 0 else opto_input
+        # Masks are cached per orientation map object; modifying a map in place is not detected
+        if OptogeneticStimulus._mask_cache_map is not orientation_map:
+            OptogeneticStimulus._mask_cache.clear()
+            OptogeneticStimulus._mask_cache_map = orientation_map
+
+        key = (self.column_tuning, self.tolerance)
+        mask = OptogeneticStimulus._mask_cache.get(key)
+        if mask is None:
+            # Create a binary mask for the target orientation (tolerant to float round-off)
+            mask = np.isclose(orientation_map, self.column_tuning, rtol=0, atol=self.tolerance).astype(np.float32)
+            mask.setflags(write=False)
+            OptogeneticStimulus._mask_cache[key] = mask
+
+        # Scale the mask by the optogenetic power
+        return mask * np.float32(self.power)
 
@@ -0,0 +1,60 @@
+# models/ssn_torch.py
+"""
+PyTorch implementation of the SSN time loop, used by SSNModel(backend="torch").
+Imported lazily so that torch is only required when this backend is selected.
+"""
+
+import torch
+import torch.fft
+
+
+def default_device():
+    """
+    Pick the device for the torch backend.
+
+    Returns:
+    - str. "cuda" if a GPU is available, otherwise "cpu".
+    """
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def to_tensor(array, device):
+    """
+    Move a numpy array onto the given device.
+
+    Parameters:
+    - array: numpy array (float32 or complex64).
+    - device: str or torch.device.
+
+    Returns:
+    - torch.Tensor on the device.
+    """
+    return torch.from_numpy(array).to(device)
+
+
+@torch.jit.script
+def run_dynamics(external_input: torch.Tensor, net_fft: torch.Tensor, n: float, time_bins: int) -> torch.Tensor:
+    """
+    Integrate the SSN rate dynamics for a batch of trials.
+
+    Parameters:
+    - external_input: 3D tensor (batch x grid x grid) of visual + optogenetic input.
+    - net_fft: 2D complex tensor. Spectrum of the excitatory minus inhibitory kernel.
+    - n: float. Exponent for the supralinear transfer function.
+    - time_bins: int. Number of time bins to simulate.
+
+    Returns:
+    - 4D tensor of firing rates (batch x grid x grid x time_bins), on the input device.
+    """
+    rows = external_input.size(1)
+    cols = external_input.size(2)
+    activity = torch.zeros([external_input.size(0), rows, cols, time_bins],
+                           dtype=external_input.dtype, device=external_input.device)
+    current = torch.zeros_like(external_input)
+
+    for t in range(time_bins):
+        recurrent = torch.fft.irfft2(torch.fft.rfft2(current) * net_fft, s=[rows, cols])
+        current = torch.clamp(external_input + recurrent, min=0.0) ** n
+        activity[:, :, :, t] = current
+
+    return activity
@@ -1,6 +1,58 @@
+from functools import lru_cache
+
 import numpy as np
 
 
+@lru_cache(maxsize=8)
+def _coords(rows, cols):
+    """
+    Normalized coordinate grids spanning [-1, 1] on each axis.
+
+    Results are cached, so the returned arrays are read-only.
+
+    Parameters:
+    - rows, cols: int. Size of the 2D grid.
+
+    Returns:
+    - x, y: 2D numpy arrays of coordinates.
+    - x2y2: 2D numpy array of x ** 2 + y ** 2.
+    """
+    x, y = np.meshgrid(np.linspace(-1, 1, cols), np.linspace(-1, 1, rows))
+    x2y2 = x ** 2 + y ** 2
+    for array in (x, y, x2y2):
+        array.setflags(write=False)
+    return x, y, x2y2
+
+
+@lru_cache(maxsize=32)
+def _gabor(orientation, spatial_frequency, size, rows, cols):
+    """
+    Generate a unit-contrast Gabor on a 2D grid.
+
+    Results are cached, so the returned array is read-only.
+
+    Parameters:
+    - orientation: float. Orientation of the Gabor (degrees).
+    - spatial_frequency: float. Cycles per degree.
+    - size: float. Size of the Gabor in degrees.
+    - rows, cols: int. Size of the 2D grid.
+
+    Returns:
+    - 2D numpy array of the Gabor.
+    """
+    x, y, x2y2 = _coords(rows, cols)
+
+    # Rotate coordinates to match orientation (only the carrier axis is needed)
+    theta = np.deg2rad(orientation)
+    x_theta = x * np.cos(theta) + y * np.sin(theta)
+
+    # Generate Gabor
+    gabor = np.exp(-x2y2 / (2 * (size ** 2))) * np.cos(
+        2 * np.pi * spatial_frequency * x_theta)
+    gabor.setflags(write=False)
+    return gabor
+
+
 class VisualStimulus:
     def __init__(self, orientation, spatial_frequency, contrast, size, onset=0):
         """
@@ -30,16 +82,7 @@ class VisualStimulus:
         - 2D numpy array of the visual input.
         """
         rows, cols = grid_size
-        x, y = np.meshgrid(np.linspace(-1, 1, cols), np.linspace(-1, 1, rows))
-
-        # Rotate coordinates to match orientation
-        theta = np.deg2rad(self.orientation)
-        x_theta = x * np.cos(theta) + y * np.sin(theta)
-        y_theta = -x * np.sin(theta) + y * np.cos(theta)
-
-        # Generate Gabor
-        gabor = np.exp(-(x ** 2 + y ** 2) / (2 * (self.size ** 2))) * np.cos(
-            2 * np.pi * self.spatial_frequency * x_theta)
+        gabor = _gabor(self.orientation, self.spatial_frequency, self.size, rows, cols)
 
         # Scale by contrast
         return self.contrast * gabor
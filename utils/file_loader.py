@@ -1,8 +1,21 @@
 import os
+from functools import lru_cache
+
 import numpy as np
 from scipy.io import loadmat
 from PIL import Image
 
+# Optional readers that let us slice the central region without loading the full file
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
 
 def crop_to_central_region(map, central_size):
     """
@@ -37,6 +50,9 @@ def load_orientation_map(filepath, central_region_size=512):
     """
     Load the orientation map from a .mat file and extract the central region.
 
+    Results are cached per (filepath, modification time, central_region_size), so repeated
+    loads of an unchanged file skip the disk read.
+
     Parameters:
     - filepath: str. Path to the .mat file containing the 'MapOrt' variable.
     - central_region_size: int, default 512. Size of the central square region to extract.
@@ -45,21 +61,70 @@ def load_orientation_map(filepath, central_region_size=512):
     - 2D numpy array of the central orientation map region.
     """
     try:
+        orientation_map_central = _load_orientation_map_cached(
+            os.path.abspath(filepath), os.path.getmtime(filepath), central_region_size)
+
+        # Hand out a copy so callers cannot modify the cached map
+        return orientation_map_central.copy()
+
+    except Exception as e:
+        raise ValueError(f"Error loading orientation map from {filepath}: {e}")
+
+
+@lru_cache(maxsize=16)
+def _load_orientation_map_cached(filepath, mtime, central_region_size):
+    """
+    Read and crop the 'MapOrt' variable of a .mat file.
+
+    Parameters:
+    - filepath: str. Absolute path to the .mat file.
+    - mtime: float. Modification time of the file; part of the cache key only.
+    - central_region_size: int. Size of the central square region to extract.
+
+    Returns:
+    - Read-only 2D numpy array of the central orientation map region.
+    """
+    # MATLAB v7.3 files are HDF5: read only the central region from disk
+    if h5py is not None and h5py.is_hdf5(filepath):
+        with h5py.File(filepath, "r") as mat_file:
+            if "MapOrt" not in mat_file:
+                raise ValueError("The .mat file must contain the 'MapOrt' variable.")
+
+            # MATLAB stores arrays column-major, so the dataset is the transposed map
+            orientation_map_central = crop_to_central_region(mat_file["MapOrt"], central_region_size).T
+    else:
         # Load the .mat file
         mat_data = loadmat(filepath)
         if "MapOrt" not in mat_data:
             raise ValueError("The .mat file must contain the 'MapOrt' variable.")
 
-        # Extract the full orientation map
-        orientation_map = mat_data["MapOrt"].astype(float)
+        # Crop to the central region before converting, so only the crop is upcast
+        orientation_map_central = crop_to_central_region(mat_data["MapOrt"], central_region_size)
 
-        # Crop to the central region
-        orientation_map_central = crop_to_central_region(orientation_map, central_region_size)
+    orientation_map_central = orientation_map_central.astype(float)
+    orientation_map_central.setflags(write=False)
+    return orientation_map_central
 
-        return orientation_map_central
 
-    except Exception as e:
-        raise ValueError(f"Error loading orientation map from {filepath}: {e}")
+def open_tif(filepath):
+    """
+    Open a TIF image, memory-mapping it when possible.
+
+    Parameters:
+    - filepath: str. Path to the TIF file.
+
+    Returns:
+    - 2D numpy array (a read-only memmap for uncompressed files when tifffile is installed).
+    """
+    if tifffile is not None:
+        try:
+            return tifffile.memmap(filepath, mode="r")
+        except ValueError:
+            # Compressed or tiled data cannot be memory-mapped; fall back to a full read
+            pass
+
+    with Image.open(filepath) as img:
+        return np.array(img)
 
 
 def search_and_load_tif(directory, target_substring, central_region_size=None):
@@ -91,14 +156,14 @@ def search_and_load_tif(directory, target_substring, central_region_size=None):
     # Load the first matching file
     target_file = os.path.join(directory, target_files[0])
     try:
-        with Image.open(target_file) as img:
-            tif_array = np.array(img)
+        tif_array = open_tif(target_file)
 
         # Optionally crop the central region
         if central_region_size is not None:
             tif_array = crop_to_central_region(tif_array, central_region_size)
 
-        return tif_array
+        # Copy so that only the (cropped) region is read into memory
+        return np.array(tif_array)
 
     except Exception as e:
         raise ValueError(f"Error loading TIF file {target_file}: {e}")
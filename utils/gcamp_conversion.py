@@ -2,16 +2,25 @@
 
 import numpy as np
 
-def convert_to_gcamp(spiking_data, expression_map):
+def convert_to_gcamp(spiking_data, expression_map, out=None, inplace=False):
     """
     Converts spiking activity to GCaMP fluorescence using an expression map.
 
     Parameters:
     - spiking_data: 3D array of spiking activity over time (e.g., 512x512x time_bins)
     - expression_map: 2D array indicating GCaMP expression level per neuron
+    - out: optional 3D array to write the fluorescence into
+    - inplace: if True (and out is None), overwrite spiking_data with the result
 
     Returns:
     - 3D array of GCaMP fluorescence data scaled by expression_map
     """
-    fluorescence = spiking_data * expression_map[..., np.newaxis]
+    # Match the expression map to floating-point spiking data so float32 stays float32
+    if np.issubdtype(spiking_data.dtype, np.floating):
+        expression_map = np.asarray(expression_map, dtype=spiking_data.dtype)
+
+    if out is None and inplace:
+        out = spiking_data
+
+    fluorescence = np.multiply(spiking_data, expression_map[..., np.newaxis], out=out)
     return fluorescence
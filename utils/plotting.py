@@ -16,7 +16,6 @@ def plot_orientation_map(orientation_map, save_path):
     plt.title("Orientation Map")
     plt.axis("off")
     plt.savefig(save_path)
-    plt.show()  # Add this line to display the plot
     plt.close()
 
 
@@ -35,7 +34,6 @@ def plot_stimulus(inputs, title, save_path):
     plt.title(title)
     plt.axis("off")
     plt.savefig(save_path)
-    plt.show()  # Add this line to display the plot
     plt.close()
 
 
@@ -44,8 +42,9 @@ def plot_condition_grid(trial_data_all_conditions, metadata, contrasts, orientat
     Plot a grid of trial activities for all conditions.
 
     Parameters:
-    - trial_data_all_conditions: list of 3D numpy arrays (trial data).
-    - metadata: list of dicts. Metadata for each trial.
+    - trial_data_all_conditions: 4D numpy array or list of 3D numpy arrays (trial data).
+    - metadata: list of dicts or structured numpy array. Metadata for each trial, with
+      'contrast', 'orientation' and 'column_tuning' fields.
     - contrasts: list of floats. Contrast levels.
     - orientations: list of floats. Visual stimulus orientations.
     - column_tunings: list of floats. Optogenetic stimulus orientations.
@@ -57,18 +56,19 @@ def plot_condition_grid(trial_data_all_conditions, metadata, contrasts, orientat
     fig, axs = plt.subplots(num_rows, num_cols, figsize=(15, 15), sharex=True, sharey=True)
     plt.subplots_adjust(hspace=0.3, wspace=0.3)
 
-    vmin, vmax = 0, np.max([np.mean(trial_data, axis=2) for trial_data in trial_data_all_conditions])
+    # Stream the maximum so only one time-averaged map is held at a time
+    vmin, vmax = 0, max(trial_data.mean(axis=2).max() for trial_data in trial_data_all_conditions)
+
+    # Map each condition to its trial index once (first match wins, as before)
+    condition_index = {}
+    for idx, meta in enumerate(metadata):
+        condition_index.setdefault((meta['contrast'], meta['orientation'], meta['column_tuning']), idx)
 
     for i, contrast in enumerate(contrasts):
         for j, orientation in enumerate(orientations):
             for k, tuning in enumerate(column_tunings):
                 # Find the trial matching the current condition
-                condition_idx = [
-                    idx for idx, meta in enumerate(metadata)
-                    if meta['contrast'] == contrast and
-                       meta['orientation'] == orientation and
-                       meta['column_tuning'] == tuning
-                ][0]  # Get the first match
+                condition_idx = condition_index[(contrast, orientation, tuning)]
 
                 avg_activity = np.mean(trial_data_all_conditions[condition_idx], axis=2)
 
@@ -82,5 +82,4 @@ def plot_condition_grid(trial_data_all_conditions, metadata, contrasts, orientat
     cbar.set_label("Neural Activity")
 
     plt.savefig(save_path)
-    plt.show()  # Add this line to display the plot
     plt.close()